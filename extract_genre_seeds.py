@@ -1,23 +1,67 @@
+import heapq
 import json
 import re
+import sys
 from collections import defaultdict
 
-with open('server/data/prepped.json', 'r', encoding='utf-8') as f:
-    tracks = json.load(f)
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def compact_track(t):
+    """Keep only the fields seed selection and the manifest need; artist and
+    tag strings are interned since they repeat across thousands of tracks"""
+    genres = t.get('genres') or []
+    return {
+        'id': t.get('id'),
+        'uri': t.get('uri'),
+        'name': t.get('name'),
+        'artists': [sys.intern(a) for a in (t.get('artists') or [])],
+        'popularity': t.get('popularity', 0),
+        'genres': genres,
+        '_lower_genres': [sys.intern(g.lower()) for g in genres],
+    }
+
+# Stream the dataset when ijson is available so the full JSON DOM is never held.
+# ijson and orjson reject the NaN/Infinity tokens json.dump writes by default,
+# so such files fall back to json.
+tracks = None
+with open('server/data/prepped.json', 'rb') as f:
+    if ijson is not None:
+        try:
+            tracks = [compact_track(t) for t in ijson.items(f, 'item', use_float=True)]
+        except ijson.JSONError:
+            f.seek(0)
+    if tracks is None:
+        raw = f.read()
+        data = None
+        if orjson is not None:
+            try:
+                data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                pass
+        if data is None:
+            data = json.loads(raw)
+        tracks = [compact_track(t) for t in data]
+        raw = data = None
 
 print(f"Loaded {len(tracks)} tracks\n")
 
+_NON_SLUG = re.compile(r'[^a-z0-9-]')
+_DASHES = re.compile(r'-+')
+
+def slugify(s):
+    return _DASHES.sub('-', _NON_SLUG.sub('', s.lower().replace(' ', '-'))).strip('-')
+
 def generate_filename(artist, track_name):
     """Generate expected filename for exported profile"""
-    safe_artist = artist.lower().replace(' ', '-')
-    safe_artist = re.sub(r'[^a-z0-9-]', '', safe_artist)
-    safe_artist = re.sub(r'-+', '-', safe_artist).strip('-')
-    
-    safe_name = track_name.lower().replace(' ', '-')
-    safe_name = re.sub(r'[^a-z0-9-]', '', safe_name)
-    safe_name = re.sub(r'-+', '-', safe_name).strip('-')
-    
-    return f"{safe_artist}_{safe_name}.json"
+    return f"{slugify(artist)}_{slugify(track_name)}.json"
 
 # ALL genres - removed detroit techno and idm
 ALL_GENRES = [
@@ -99,82 +143,108 @@ EXCLUSIONS = {
     "folk": ["indie folk"],
 }
 
-def genre_match(search_genre, track_genres):
-    if search_genre in EXCLUSIONS:
-        for exclusion in EXCLUSIONS[search_genre]:
-            if any(exclusion.lower() in g.lower() for g in track_genres):
-                return False
-    
-    pattern = r'\b' + re.escape(search_genre.lower()) + r'\b'
-    return any(re.search(pattern, g.lower()) for g in track_genres)
+# Compile word-boundary patterns once instead of per lookup
+COMPILED = {g: re.compile(r'\b' + re.escape(g.lower()) + r'\b') for g in ALL_GENRES}
+LOWER_EXCLUSIONS = {g: [e.lower() for e in excl] for g, excl in EXCLUSIONS.items()}
+
+# Inverted index: lowercased tag -> indices of the tracks carrying it
+tag_index = defaultdict(set)
+for i, track in enumerate(tracks):
+    for tag in track['_lower_genres']:
+        tag_index[tag].add(i)
+
+def tracks_with_tags(tags):
+    hit = set()
+    for tag in tags:
+        hit |= tag_index[tag]
+    return hit
+
+def collect_matches(genre):
+    """Indices of tracks matching a genre, minus its exclusions.
+
+    Resolves the genre against the tag vocabulary rather than every track.
+    Reads only the static index, so genres are independent of each other;
+    the used-track/artist reconciliation happens afterwards, serially.
+    """
+    pat = COMPILED[genre]
+    hit = tracks_with_tags(tag for tag in tag_index if pat.search(tag))
+    exclusions = LOWER_EXCLUSIONS.get(genre)
+    if hit and exclusions:
+        hit -= tracks_with_tags(
+            tag for tag in tag_index if any(e in tag for e in exclusions)
+        )
+    return hit
+
+matches_by_genre = dict(zip(ALL_GENRES, map(collect_matches, ALL_GENRES)))
+
+def purity_tier(track):
+    """0 = pure, 1 = medium, 2 = broad; lower tiers are picked first"""
+    num_genres = len(track.get('genres', []))
+    if num_genres <= 2:
+        return 0
+    elif num_genres <= 4:
+        return 1
+    return 2
+
+# Per-track columns indexed like `tracks`, read once so the selection loop
+# works on track indices instead of looking fields up in each dict
+popularity_col = [t.get('popularity', 0) for t in tracks]
+tier_col = [purity_tier(t) for t in tracks]
+artist_col = [t['artists'][0] if t['artists'] else None for t in tracks]
+
+# Track indices by id and by primary artist, so picking a seed can block
+# every other copy of it with one set union
+indices_by_id = defaultdict(set)
+indices_by_artist = defaultdict(set)
+for i, track in enumerate(tracks):
+    indices_by_id[track['id']].add(i)
+    if artist_col[i]:
+        indices_by_artist[artist_col[i]].add(i)
+
+def by_tier_then_popularity(indices):
+    """Yield track indices pure → medium → broad, most popular first within
+    a tier, popping a heap lazily so only the few tracks actually taken are
+    ordered (ties keep dataset order)"""
+    heap = [(tier_col[i], -popularity_col[i], i) for i in indices]
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap)[2]
 
-used_track_ids = set()
 used_artists = set()
+blocked = set()  # indices of tracks whose id or primary artist is already used
 results = {}
 
 for genre in ALL_GENRES:
-    candidates = []
-    for track in tracks:
-        if track['id'] in used_track_ids:
-            continue
-        
-        primary_artist = track['artists'][0] if track.get('artists') else None
-        if primary_artist and primary_artist in used_artists:
-            continue
-        
-        track_genres = track.get('genres', [])
-        if not track_genres:
-            continue
-        
-        if genre_match(genre, track_genres):
-            candidates.append(track)
+    candidates = matches_by_genre[genre] - blocked
     
     if not candidates:
         results[genre] = []
         continue
     
-    # GROUP BY PURITY TIERS, THEN PICK MOST POPULAR WITHIN EACH TIER
-    purity_tiers = defaultdict(list)
-    for track in candidates:
-        num_genres = len(track.get('genres', []))
-        if num_genres <= 2:
-            tier = 'pure'
-        elif num_genres <= 4:
-            tier = 'medium'
-        else:
-            tier = 'broad'
-        purity_tiers[tier].append(track)
-    
-    # Sort each tier by popularity (descending)
-    for tier in purity_tiers:
-        purity_tiers[tier].sort(key=lambda t: -t.get('popularity', 0))
-    
+    # PICK MOST POPULAR WITHIN EACH PURITY TIER
     # Collect top 4 (changed from 3), prioritizing pure → medium → broad
     top_4 = []
     genre_artists = set()
     
-    for tier in ['pure', 'medium', 'broad']:
+    for i in by_tier_then_popularity(candidates):
+        artist = artist_col[i]
+        if artist and artist in genre_artists:
+            continue
+        
+        top_4.append(tracks[i])
+        if artist:
+            genre_artists.add(artist)
+        
         if len(top_4) >= 4:  # Changed from 3
             break
-        
-        for track in purity_tiers.get(tier, []):
-            artist = track['artists'][0] if track.get('artists') else None
-            if artist and artist in genre_artists:
-                continue
-            
-            top_4.append(track)
-            if artist:
-                genre_artists.add(artist)
-            
-            if len(top_4) >= 4:  # Changed from 3
-                break
     
     results[genre] = top_4
     
     for t in top_4:
-        used_track_ids.add(t['id'])
+        blocked |= indices_by_id[t['id']]
         if t.get('artists'):
             used_artists.add(t['artists'][0])
+            blocked |= indices_by_artist.get(t['artists'][0], set())
 
 # Build hierarchical manifest (same as before)
 GENRE_TREE = {
@@ -374,38 +444,49 @@ GENRE_TREE = {
         }
     }
 }
-def build_manifest(tree):
-    if isinstance(tree, dict):
-        result = {}
-        for key, value in tree.items():
-            if key == "_seeds":
-                # This level is playable - add its seeds
-                genre_name = value
-                if results.get(genre_name):
-                    result["seeds"] = [
-                        {
-                            "uri": t['uri'],
-                            "name": t['name'],
-                            "artist": t['artists'][0] if t.get('artists') else 'Unknown',
-                            "popularity": t.get('popularity', 0),
-                            "filename": generate_filename(
-                                t['artists'][0] if t.get('artists') else 'unknown',
-                                t['name']
-                            )
-                        }
-                        for t in results[genre_name]
-                    ]
-            else:
-                # Recurse into subgenres
-                result[key] = build_manifest(value)
-        return result
-    else:
-        return {}
-
-manifest = build_manifest(GENRE_TREE)
-
-with open('genre_constellation_manifest.json', 'w', encoding='utf-8') as f:
-    json.dump(manifest, f, indent=2, ensure_ascii=False)
+def flatten_tree(tree):
+    """Walk the tree once into (path, seeds_name) rows in pre-order"""
+    rows = []
+    stack = [((), tree)]
+    while stack:
+        path, node = stack.pop()
+        if not isinstance(node, dict):
+            rows.append((path, None))
+            continue
+        rows.append((path, node.get("_seeds")))
+        children = [(path + (key,), value) for key, value in node.items() if key != "_seeds"]
+        stack.extend(reversed(children))
+    return rows
+
+TREE_ROWS = flatten_tree(GENRE_TREE)
+
+manifest = {}
+for path, genre_name in TREE_ROWS:
+    node = manifest
+    for key in path:
+        node = node.setdefault(key, {})
+    if genre_name is not None and results.get(genre_name):
+        # This level is playable - add its seeds
+        node["seeds"] = [
+            {
+                "uri": t['uri'],
+                "name": t['name'],
+                "artist": t['artists'][0] if t.get('artists') else 'Unknown',
+                "popularity": t.get('popularity', 0),
+                "filename": generate_filename(
+                    t['artists'][0] if t.get('artists') else 'unknown',
+                    t['name']
+                )
+            }
+            for t in results[genre_name]
+        ]
+
+if orjson is not None:
+    with open('genre_constellation_manifest.json', 'wb') as f:
+        f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+else:
+    with open('genre_constellation_manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
 
 # Output URIs
 print("=" * 60)
@@ -429,16 +510,21 @@ print("\n" + "=" * 60)
 print("REPORT:")
 print("=" * 60)
 total_found = 0
+full_genres = 0
 issues = []
 
 for genre in ALL_GENRES:
-    count = len(results[genre])
+    picks = results[genre]
+    count = len(picks)
     total_found += count
     
     status = "✓" if count == 4 else "⚠️" if count > 0 else "✗"  # Changed from 3
     
+    if count == 4:
+        full_genres += 1
+    
     if count > 0:
-        avg_pop = sum(t.get('popularity', 0) for t in results[genre]) / count
+        avg_pop = sum(t.get('popularity', 0) for t in picks) / count
         print(f"{status} {genre:<30} {count}/4 tracks (avg pop: {avg_pop:.0f})")  # Changed from /3
     
     if count < 4 and count > 0:  # Changed from 3
@@ -446,7 +532,7 @@ for genre in ALL_GENRES:
 
 print(f"\nTotal unique tracks: {total_found}")
 print(f"\nTotal unique artists: {len(used_artists)}")
-print(f"Genres with 4 tracks: {len([g for g in ALL_GENRES if len(results[g]) == 4])}")  # Changed from 3
+print(f"Genres with 4 tracks: {full_genres}")  # Changed from 3
 
 if issues:
     print(f"\n⚠️  GENRES WITH LOW COVERAGE:")
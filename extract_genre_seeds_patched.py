@@ -1,26 +1,57 @@
 import json
 import re
 import math
+import sys
 from collections import defaultdict, Counter
 from typing import Any, Dict, Tuple, List, Set
 from datetime import datetime, timezone
+from functools import lru_cache
+from operator import itemgetter
+import heapq
 import random
 random.seed(42)
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # -------- Load dataset --------
-with open('server/data/prepped.json', 'r', encoding='utf-8') as f:
-    tracks = json.load(f)
+with open('server/data/prepped.json', 'rb') as f:
+    raw = f.read()
+tracks = None
+if orjson is not None:
+    try:
+        tracks = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        pass  # NaN/Infinity tokens (json.dump's default) need the json parser
+if tracks is None:
+    tracks = json.loads(raw)
+raw = None
 
 print(f"Loaded {len(tracks)} tracks\n")
 
 # -------- Helpers --------
+class _SlugTable(dict):
+    """str.translate table: space -> '-', keep [a-z0-9-], drop everything
+    else. Entries are filled in lazily as new code points are seen."""
+    _KEEP = frozenset("abcdefghijklmnopqrstuvwxyz0123456789-")
+
+    def __missing__(self, cp):
+        ch = chr(cp)
+        out = "-" if ch == " " else (ch if ch in self._KEEP else None)
+        self[cp] = out
+        return out
+
+_SLUG_TABLE = _SlugTable()
+_DASHES = re.compile(r'-+')
+
+def slugify(s):
+    return _DASHES.sub('-', s.lower().translate(_SLUG_TABLE)).strip('-')
+
 def generate_filename(artist, track_name):
-    safe_artist = (artist or 'unknown').lower().replace(' ', '-')
-    safe_artist = re.sub(r'[^a-z0-9-]', '', safe_artist)
-    safe_artist = re.sub(r'-+', '-', safe_artist).strip('-')
-    safe_name = (track_name or 'unknown').lower().replace(' ', '-')
-    safe_name = re.sub(r'[^a-z0-9-]', '', safe_name)
-    safe_name = re.sub(r'-+', '-', safe_name).strip('-')
+    safe_artist = slugify(artist or 'unknown')
+    safe_name = slugify(track_name or 'unknown')
     return f"{safe_artist}-{safe_name}.json"
 
 def clamp(x, lo, hi):
@@ -47,8 +78,7 @@ def median_sorted(vals):
 def median(vals):
     return median_sorted(sorted(vals))
 
-def linear_quantile(vals, q):
-    xs = sorted(vals)
+def linear_quantile_sorted(xs, q):
     n = len(xs)
     if n == 0:
         return None
@@ -65,11 +95,13 @@ def linear_quantile(vals, q):
 def mean(vals):
     return float(sum(vals) / len(vals)) if vals else float("nan")
 
-def stddev(vals):
+def stddev(vals, m=None):
+    # callers that already have the mean pass it in, saving a pass over vals
     n = len(vals)
     if n <= 1:
         return 0.0
-    m = mean(vals)
+    if m is None:
+        m = mean(vals)
     return math.sqrt(sum((x - m) ** 2 for x in vals) / (n - 1))
 
 def sround(x, nd=2):
@@ -402,42 +434,56 @@ GENRE_RULES: Dict[str, Dict[str, Any]] = {
     },
 }
 
-def genre_match(search_genre: str, track_genres: List[str]) -> bool:
-    if search_genre in EXCLUSIONS:
-        for exclusion in EXCLUSIONS[search_genre]:
-            if any(exclusion.lower() in g.lower() for g in track_genres):
-                return False
+EXCLUSIONS_LC: Dict[str, List[str]] = {g: [e.lower() for e in excl] for g, excl in EXCLUSIONS.items()}
+
+def genre_match(search_genre: str, track: Dict[str, Any]) -> bool:
+    """Match against the track's precomputed _tags_lc / _tags_joined."""
+    joined = track["_tags_joined"]
+    for exclusion in EXCLUSIONS_LC.get(search_genre, ()):
+        if exclusion in joined:
+            return False
     sg = search_genre.lower().strip()
-    pat = re.compile(rf"\b{re.escape(sg)}\b")
-    for tg in track_genres:
-        t = tg.lower().strip()
+    # cheap reject: no tag even contains the genre as a substring
+    if sg not in joined:
+        return False
+    pat = GENRE_PATTERNS[sg]
+    for t in track["_tags_lc"]:
         if t == sg:
             return True
         if pat.search(t):
             return True
     return False
 
-def passes_rules(target_genre: str, track: Dict[str, Any]) -> bool:
-    rules = GENRE_RULES.get(target_genre.lower())
-    if not rules:
-        return True
-
-    a_gen = [g.lower() for g in (track.get("artist_genres") or track.get("genres") or [])]
-
-    req = rules.get("require_artist_genres_any") or []
-    if req and not any(any(r in g for g in a_gen) for r in req):
-        return False
-
-    deny = rules.get("deny_artist_genres_any") or []
-    if deny and any(any(d in g for g in a_gen) for d in deny):
-        return False
+def _any_substring_matcher(terms: List[str]):
+    """One alternation regex per term list: a single scan over a track's
+    _tags_joined answers "does any term occur in any tag"."""
+    if not terms:
+        return None
+    return re.compile("|".join(re.escape(t.lower()) for t in terms))
+
+# (require, deny) matchers per rule set, built once
+RULE_MATCHERS = {
+    g: (
+        _any_substring_matcher(r.get("require_artist_genres_any") or []),
+        _any_substring_matcher(r.get("deny_artist_genres_any") or []),
+    )
+    for g, r in GENRE_RULES.items()
+}
 
-    y = track.get("release_year")
+def parse_year(y: Any):
     try:
-        y = int(y) if y is not None else None
+        return int(y) if y is not None else None
     except:
-        y = None
+        return None
+
+def passes_rules(target_genre: str, track: Dict[str, Any]) -> bool:
+    target = target_genre.lower()
+    rules = GENRE_RULES.get(target)
+    if not rules:
+        return True
 
+    # numeric gates first: cheap, and read values parsed once in the prepass
+    y = track["_year"]
     min_year = rules.get("min_year")
     if min_year is not None and y is not None and y < min_year:
         return False
@@ -446,7 +492,7 @@ def passes_rules(target_genre: str, track: Dict[str, Any]) -> bool:
     if max_year is not None and y is not None and y > max_year:
         return False
 
-    pop = float(track.get("popularity", 0))
+    pop = track["_pop"]
     popmin = rules.get("popularity_min")
     if popmin is not None and pop < float(popmin):
         return False
@@ -454,84 +500,109 @@ def passes_rules(target_genre: str, track: Dict[str, Any]) -> bool:
     if popmax is not None and pop > float(popmax):
         return False
 
+    # tracks by the same artist share their tags, so most calls hit the cache
+    return _passes_tag_rules(target, track["_tags_joined"])
+
+@lru_cache(maxsize=None)
+def _passes_tag_rules(target: str, joined: str) -> bool:
+    req_re, deny_re = RULE_MATCHERS[target]
+    if req_re and not req_re.search(joined):
+        return False
+
+    if deny_re and deny_re.search(joined):
+        return False
+
     return True
 
-def seed_confidence(target_genre, track):
+def seed_confidence(rules, matchers, track):
+    """Confidence for one picked seed. `rules`/`matchers` are the genre's
+    GENRE_RULES and RULE_MATCHERS entries, looked up once by the caller."""
     conf = 1.0
     reasons = []
-    rules = GENRE_RULES.get(target_genre.lower())
-    a_gen = [g.lower() for g in (track.get("artist_genres") or track.get("genres") or [])]
     if rules:
+        req_re, deny_re = matchers
+        joined = track["_tags_joined"]
         req = rules.get("require_artist_genres_any") or []
-        if req and any(any(r in g for g in a_gen) for r in req):
+        if req_re and req_re.search(joined):
             conf += 0.15
         elif req:
             conf -= 0.45
             reasons.append(f"missing-required-artist-genre:{req}")
         deny = rules.get("deny_artist_genres_any") or []
-        if deny and any(any(d in g for g in a_gen) for d in deny):
+        if deny_re and deny_re.search(joined):
             conf -= 0.5
             reasons.append(f"denied-artist-genre:{deny}")
+        y = track["_year"]
         min_year = rules.get("min_year")
         if min_year is not None and isinstance(min_year, int):
-            if track.get("release_year") and int(track["release_year"]) < min_year:
+            if y and y < min_year:
                 conf -= 0.25
                 reasons.append(f"year<{min_year}")
         max_year = rules.get("max_year")
         if max_year is not None and isinstance(max_year, int):
-            if track.get("release_year") and int(track["release_year"]) > max_year:
+            if y and y > max_year:
                 conf -= 0.25
                 reasons.append(f"year>{max_year}")
-    if not a_gen:
+    if not track["_tags_lc"]:
         conf -= 0.1
         reasons.append("no-artist-genres")
     return max(0.0, conf), reasons
 
-# -------- Gather playable genres from tree --------
-def gather_playable_genres(tree):
-    genres = []
-    def walk(node):
+# -------- Walk tree once: playable genres + parent maps --------
+def walk_tree(tree: Dict[str, Any]) -> Tuple[List[str], Dict[str, str], Dict[str, Set[str]]]:
+    """Collect playable seeds (pre-order, de-duplicated) and the
+    child->parent / parent->descendants maps in a single traversal.
+
+    Seeds are gathered from every nested dict/list. Parent links are only
+    recorded along "subgenres" chains starting at `tree` itself, the same
+    reach the separate build_parent_maps pass had; a bare mapping of
+    top-level genres has no "subgenres" key, so it contributes none.
+    """
+    genres: List[str] = []
+    genre_to_parent: Dict[str, str] = {}
+    parent_to_desc: Dict[str, Set[str]] = {}
+
+    def walk(node: Any, parent_seed: str = "", linked: bool = True):
+        if isinstance(node, list):
+            for it in node:
+                walk(it, linked=False)
+            return
         if not isinstance(node, dict):
             return
-        if "_seeds" in node and isinstance(node["_seeds"], str):
-            genres.append(node["_seeds"])
-        for v in node.values():
-            if isinstance(v, dict):
-                walk(v)
-            elif isinstance(v, list):
-                for it in v:
-                    walk(it)
+        this_seed = node.get("_seeds") if isinstance(node.get("_seeds"), str) else None
+        if this_seed:
+            genres.append(this_seed)
+        for key, v in node.items():
+            if key == "subgenres" and isinstance(v, dict) and linked:
+                parent_label = this_seed or parent_seed
+                if parent_label and parent_label not in parent_to_desc:
+                    parent_to_desc[parent_label] = set()
+                for child in v.values():
+                    if isinstance(child, dict):
+                        child_seed = child.get("_seeds") if isinstance(child.get("_seeds"), str) else None
+                        if child_seed:
+                            genre_to_parent[child_seed] = parent_label or ""
+                            if parent_label:
+                                parent_to_desc[parent_label].add(child_seed)
+                        walk(child, parent_label)
+                    else:
+                        walk(child, linked=False)
+            elif isinstance(v, (dict, list)):
+                walk(v, linked=False)
+
     walk(tree)
     seen = set(); ordered = []
     for g in genres:
         if g not in seen:
             seen.add(g); ordered.append(g)
-    return ordered
+    return ordered, genre_to_parent, parent_to_desc
 
-PLAYABLE_GENRES = gather_playable_genres(GENRE_TREE)
+PLAYABLE_GENRES, GENRE_TO_PARENT, PARENT_TO_DESC = walk_tree(GENRE_TREE)
 
-def build_parent_maps(tree: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, Set[str]]]:
-    genre_to_parent: Dict[str, str] = {}
-    parent_to_desc: Dict[str, Set[str]] = {}
-    def walk(node: Dict[str, Any], parent_seed: str = ""):
-        this_seed = node.get("_seeds") if isinstance(node.get("_seeds"), str) else None
-        subs = node.get("subgenres")
-        if isinstance(subs, dict):
-            parent_label = this_seed or parent_seed
-            if parent_label and parent_label not in parent_to_desc:
-                parent_to_desc[parent_label] = set()
-            for _, child in subs.items():
-                if isinstance(child, dict):
-                    child_seed = child.get("_seeds") if isinstance(child.get("_seeds"), str) else None
-                    if child_seed:
-                        genre_to_parent[child_seed] = parent_label or ""
-                        if parent_label:
-                            parent_to_desc[parent_label].add(child_seed)
-                    walk(child, parent_label)
-    walk(tree)
-    return genre_to_parent, parent_to_desc
-
-GENRE_TO_PARENT, PARENT_TO_DESC = build_parent_maps(GENRE_TREE)
+# word-boundary pattern per playable genre, compiled once
+GENRE_PATTERNS: Dict[str, "re.Pattern[str]"] = {
+    g.lower().strip(): re.compile(rf"\b{re.escape(g.lower().strip())}\b") for g in PLAYABLE_GENRES
+}
 
 # -------- Seed selection --------
 results: Dict[str, List[Dict[str, Any]]] = {}
@@ -542,36 +613,93 @@ used_track_ids_by_parent: Dict[str, Set[str]] = defaultdict(set)
 used_artists_by_parent: Dict[str, Set[str]] = defaultdict(set)
 ARTIST_FAMILY_CAP = 1
 
-def proto_score(target_genre: str, t: Dict[str, Any]) -> float:
-    tags = norm_tags(t.get("artist_genres") or t.get("genres"))
-    target = target_genre.lower()
-    exact = 1.0 if any(g == target for g in tags) else 0.0
-    boundary = 1.0 if any(re.search(rf"\b{re.escape(target)}\b", g) for g in tags) else 0.0
+# tags that mark a track as pop/soundtrack-contaminated (same for every genre)
+BAD_TOKENS = frozenset({"dance pop","pop","electropop","synthpop","soundtrack","broadway","film soundtrack","show tunes"})
+
+def popularity_score(t: Dict[str, Any]) -> float:
+    """Genre-independent popularity part of proto_score."""
     pop = float(t.get("popularity", 0)) / 100.0
-    bad_tokens = {"dance pop","pop","electropop","synthpop","soundtrack","broadway","film soundtrack","show tunes"}
-    has_bad = any(any(bt in g for bt in bad_tokens) for g in tags)
     pop_penalty = 0.25 if pop >= 0.85 else 0.0
-    contam_penalty = 0.30 if has_bad else 0.0
     very_popular_artist = float(t.get("popularity", 0)) >= 90
     artist_penalty = 0.15 if very_popular_artist else 0.0
-    jitter = random.random() * 0.03
-    return (2.5 * exact) + (1.5 * boundary) + (0.5 * pop) - pop_penalty - contam_penalty - artist_penalty + jitter
+    return (0.5 * pop) - pop_penalty - artist_penalty
+
+# normalize every track's tags (and the genre-independent score terms) once
+# instead of per (genre, track) pair
+for t in tracks:
+    # intern ids/artists: they are hashed into the used_* sets over and over
+    for key in ("uri", "id"):
+        if isinstance(t.get(key), str):
+            t[key] = sys.intern(t[key])
+    if t.get("artists"):
+        t["artists"] = [sys.intern(a) if isinstance(a, str) else a for a in t["artists"]]
+    tags = norm_tags(t.get("artist_genres") or t.get("genres"))
+    t["_tags_lc"] = tuple(tags)
+    t["_tags_joined"] = " | " + " | ".join(tags) + " | "
+    t["_year"] = parse_year(t.get("release_year"))
+    t["_pop"] = float(t.get("popularity", 0))
+    t["_pop_score"] = popularity_score(t)
+    t["_has_bad"] = any(bt in t["_tags_joined"] for bt in BAD_TOKENS)
+    # tie-break jitter drawn once per track (seeded above), so a score no
+    # longer depends on how many proto_score calls happened before it
+    t["_jitter"] = random.random() * 0.03
+
+def proto_score(target_genre: str, t: Dict[str, Any]) -> float:
+    tags = t["_tags_lc"]
+    target = target_genre.lower()
+    exact = 1.0 if any(g == target for g in tags) else 0.0
+    pat = GENRE_PATTERNS[target.strip()]
+    boundary = 1.0 if any(pat.search(g) for g in tags) else 0.0
+    contam_penalty = 0.30 if t["_has_bad"] else 0.0
+    return (2.5 * exact) + (1.5 * boundary) + t["_pop_score"] - contam_penalty + t["_jitter"]
+
+def ranked_by_score(scored: List[Tuple[float, Dict[str, Any]]], shortlist: int):
+    """Yield tracks best score first (ties keep candidate order).
+
+    Only the top `shortlist` are selected with a heap; the full sort runs
+    only if the caller consumes past them (e.g. many family-artist skips).
+    """
+    head = heapq.nlargest(shortlist, scored, key=itemgetter(0))
+    for _, t in head:
+        yield t
+    if len(head) < len(scored):
+        for _, t in sorted(scored, key=itemgetter(0), reverse=True)[len(head):]:
+            yield t
+
+# tag -> playable genres it can match, resolved lazily once per distinct tag
+GENRES_BY_TAG: Dict[str, List[str]] = {}
+
+def genres_for_tag(tag: str) -> List[str]:
+    hit = GENRES_BY_TAG.get(tag)
+    if hit is None:
+        hit = GENRES_BY_TAG[tag] = [
+            g for g in PLAYABLE_GENRES
+            if tag == g.lower().strip() or GENRE_PATTERNS[g.lower().strip()].search(tag)
+        ]
+    return hit
+
+# single pass over tracks: bucket each one under every genre it matches and
+# passes the rules for (dataset order is kept within a bucket)
+candidates_by_genre: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+for track in tracks:
+    tid = track.get("uri") or track.get("id")
+    if tid in TRACK_DENY_URIS:
+        continue
+    if not track["_tags_lc"]:
+        continue
+    hit: Set[str] = set()
+    for tag in track["_tags_lc"]:
+        hit.update(genres_for_tag(tag))
+    for genre in hit:
+        if genre_match(genre, track) and passes_rules(genre, track):
+            candidates_by_genre[genre].append(track)
 
 for genre in PLAYABLE_GENRES:
     parent = GENRE_TO_PARENT.get(genre, "")
 
     candidates: List[Dict[str, Any]] = []
-    for track in tracks:
+    for track in candidates_by_genre.get(genre, []):
         tid = track.get("uri") or track.get("id")
-        if tid in TRACK_DENY_URIS:
-            continue
-        track_genres = norm_tags(track.get('artist_genres') or track.get('genres'))
-        if not track_genres:
-            continue
-        if not genre_match(genre, track_genres):
-            continue
-        if not passes_rules(genre, track):
-            continue
         if parent and tid and tid in used_track_ids_by_parent[parent]:
             continue
         candidates.append(track)
@@ -580,9 +708,9 @@ for genre in PLAYABLE_GENRES:
         results[genre] = []
         continue
 
-    seen_ids: Set[str] = set()
+    # first track per id wins; dict keeps insertion order
+    unique_by_id: Dict[str, Dict[str, Any]] = {}
     seen_artists: Set[str] = set()
-    unique_candidates: List[Dict[str, Any]] = []
 
     for t in candidates:
         tid = t.get("id") or t.get("uri")
@@ -591,21 +719,21 @@ for genre in PLAYABLE_GENRES:
             continue
         if GLOBAL_UNIQUENESS and (tid in used_track_ids_global or artist in used_artists_global):
             continue
-        if tid in seen_ids or artist in seen_artists:
+        if tid in unique_by_id or artist in seen_artists:
             continue
-        seen_ids.add(tid)
+        unique_by_id[tid] = t
         seen_artists.add(artist)
-        unique_candidates.append(t)
 
+    unique_candidates = list(unique_by_id.values())
     if not unique_candidates:
         results[genre] = []
         continue
 
-    unique_candidates.sort(key=lambda t_: proto_score(genre, t_), reverse=True)
+    scored = [(proto_score(genre, t_), t_) for t_ in unique_candidates]
 
     top_k: List[Dict[str, Any]] = []
     family_artists = used_artists_by_parent[parent] if parent else set()
-    for t in unique_candidates:
+    for t in ranked_by_score(scored, ARTIST_FAMILY_CAP * 16):
         if len(top_k) >= 4:
             break
         artist = (t.get('artists') or [''])[0]
@@ -624,8 +752,10 @@ for genre in PLAYABLE_GENRES:
 
     results[genre] = top_k
 
+    rules = GENRE_RULES.get(genre.lower())
+    matchers = RULE_MATCHERS.get(genre.lower())
     for t in top_k:
-        conf, reasons = seed_confidence(genre, t)
+        conf, reasons = seed_confidence(rules, matchers, t)
         if conf < 0.7:
             low_confidence.append({
                 "genre": genre,
@@ -641,25 +771,22 @@ for genre in PLAYABLE_GENRES:
 
 # -------- Feature computation helpers --------
 FEATURE_FIELDS = ["danceability","energy","speechiness","acousticness","valence","popularity","instrumentalness"]
+SEED_VALUE_FIELDS = FEATURE_FIELDS + ["tempo"]  # tempo is collected in the same pass
 
 def compute_features_from_tracks(seed_tracks: List[Dict[str, Any]]):
     fvals = defaultdict(list)
     years = []
-    tempos = []
     for t in seed_tracks:
-        for f in FEATURE_FIELDS:
+        for f in SEED_VALUE_FIELDS:
             v = t.get(f)
             if v is not None:
                 try: fvals[f].append(float(v))
                 except: pass
-        bpm = t.get("tempo")
-        if bpm is not None:
-            try: tempos.append(float(bpm))
-            except: pass
         y = t.get("release_year")
         try:
             if y is not None: years.append(int(y))
         except: pass
+    tempos = fvals.pop("tempo", None)
     feat = {}
     for k, vals in fvals.items():
         if vals: feat[k] = sround(median(vals), 2)
@@ -772,29 +899,23 @@ for t in seed_pool.values():
     if t.get("tempo") is not None:
         try: tn = tempo_to_norm(float(t["tempo"]))
         except: tn = None
-    mapping = {
-        "danceability": t.get("danceability"),
-        "energy": t.get("energy"),
-        "speechiness": t.get("speechiness"),
-        "acousticness": t.get("acousticness"),
-        "valence": t.get("valence"),
-        "tempo_norm": tn,
-        "popularity": t.get("popularity"),
-        "instrumentalness": t.get("instrumentalness"),
-    }
-    for k, v in mapping.items():
+    # every column but tempo_norm reads the track field of the same name
+    for k, col in accum.items():
+        v = tn if k == "tempo_norm" else t.get(k)
         try:
-            if v is not None: accum[k].append(float(v))
+            if v is not None: col.append(float(v))
         except: pass
 
 means = {}; stddevs = {}; quantiles = {}
 for k, vals in accum.items():
     if vals:
-        means[k] = sround(mean(vals), 2)
-        stddevs[k] = sround(stddev(vals), 2)
-        q10 = linear_quantile(vals, 0.10)
-        q50 = linear_quantile(vals, 0.50)
-        q90 = linear_quantile(vals, 0.90)
+        m = mean(vals)
+        means[k] = sround(m, 2)
+        stddevs[k] = sround(stddev(vals, m), 2)
+        xs = sorted(vals)  # one sort shared by all three quantiles
+        q10 = linear_quantile_sorted(xs, 0.10)
+        q50 = linear_quantile_sorted(xs, 0.50)
+        q90 = linear_quantile_sorted(xs, 0.90)
         quantiles[k] = {"p10": sround(q10, 2), "p50": sround(q50, 2), "p90": sround(q90, 2)}
     else:
         means[k] = None; stddevs[k] = None
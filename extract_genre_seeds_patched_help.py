@@ -5,16 +5,23 @@
 
 from __future__ import annotations
 
+import heapq
 import json
 import math
 import random
+import re
 import sys
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import datetime, timezone
-from statistics import median
-from typing import Any, Dict, List, Optional, Tuple, Set, Mapping, MutableMapping, Iterable, Union, cast
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Set, Mapping, MutableMapping, Iterable, Union, cast
 import os, sys, time, json, math, argparse
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ============================================================
 # Types
 # ============================================================
@@ -24,6 +31,7 @@ ResultBucket = Dict[str, List[Track]]
 ManifestNode = Dict[str, Any]
 ManifestTree = Dict[str, ManifestNode]
 FeatureDict = Dict[str, Optional[float]]
+ArtistIndex = Dict[str, List[Tuple[int, Track]]]
 
 # ============================================================
 # Config
@@ -46,58 +54,75 @@ SAMPLE_SIZE_PER_GENRE_DEFAULT = 5
 SEEDS_PER_GENRE_DEFAULT = 4
 
 # Shoegaze canonical artists to ensure coverage
-SHOEGAZE_WHITELIST_ARTISTS: Set[str] = {
+SHOEGAZE_WHITELIST_ARTISTS: FrozenSet[str] = frozenset({
     "my bloody valentine", "slowdive", "ride", "lush", "chapterhouse",
     "cocteau twins", "pale saints", "alcest", "mbv", "catherine wheel"
-}
+})
 
 # Punk filters
-PUNK_NEG_GENRES: Set[str] = {
+PUNK_NEG_GENRES: FrozenSet[str] = frozenset({
     "ska", "ska punk", "third wave ska", "2 tone", "skacore", "ska revival"
-}
-PUNK_POS_GENRES: Set[str] = {
+})
+PUNK_POS_GENRES: FrozenSet[str] = frozenset({
     "punk", "punk rock", "hardcore punk", "77 punk", "post-punk", "anarcho-punk"
-}
+})
 
 # East Coast Hip Hop signals
-EC_HIPHOP_POS_GENRES: Set[str] = {
+EC_HIPHOP_POS_GENRES: FrozenSet[str] = frozenset({
     "east coast hip hop", "nyc rap", "boom bap", "queens hip hop",
     "brooklyn drill", "harlem hip hop"
-}
-EC_HIPHOP_WHITELIST_ARTISTS: Set[str] = {
+})
+EC_HIPHOP_WHITELIST_ARTISTS: FrozenSet[str] = frozenset({
     "the notorious b.i.g.", "biggie", "nas", "mobb deep", "wu-tang clan",
     "jay-z", "a tribe called quest", "gang starr", "rakim", "eric b. & rakim",
     "onyx", "fat joe", "mos def", "yasiin bey", "talib kweli", "big l",
     "busta rhymes", "cam’ron", "camron", "redman", "method man",
     "ghostface killah", "raekwon", "joey bada$$", "public enemy", "black star"
-}
+})
 
 # Disco rules
-DISCO_POS_GENRES: Set[str] = {"disco", "classic disco", "philly soul", "hi-nrg", "italo disco"}
-DISCO_BLOCKLIST_HINTS: Set[str] = {"footloose", "soundtrack", "ost"}
+DISCO_POS_GENRES: FrozenSet[str] = frozenset({"disco", "classic disco", "philly soul", "hi-nrg", "italo disco"})
+DISCO_BLOCKLIST_HINTS: FrozenSet[str] = frozenset({"footloose", "soundtrack", "ost"})
 
 # Nu Metal cleanup
-NU_METAL_BAD_HINTS: Set[str] = {"acoustic", "unplugged", "remix", "radio edit"}
+NU_METAL_BAD_HINTS: FrozenSet[str] = frozenset({"acoustic", "unplugged", "remix", "radio edit"})
 
 # Metal nudges so pure metal outranks crossover
-CANONICAL_METAL_ARTIST_HINTS: Set[str] = {
+CANONICAL_METAL_ARTIST_HINTS: FrozenSet[str] = frozenset({
     "metallica", "slayer", "pantera", "anthrax", "megadeth",
     "judas priest", "iron maiden", "sepultura", "meshuggah", "lamb of god"
-}
+})
 
 # Exceptions and swaps reported by you
-CURATION_EXCLUDE_URIS: Set[str] = {
+CURATION_EXCLUDE_URIS: FrozenSet[str] = frozenset({
     "spotify:track:1OppEieGNdItZbE14gLBEv",  # Supremes not funk
     "spotify:track:0B9x2BRHqj3Qer7biM3pU3",  # Grease not disco
     "spotify:track:3Be7CLdHZpyzsVijme39cW",  # Kygo not disco
     "spotify:track:6JyEh4kl9DLwmSAoNDRn5b",  # 4th Dimension not swing or soul
     "spotify:track:2wSAWEYUHkt92X4SBAPqZE",  # Karma Chameleon not romantic classical
-}
+})
+
+# Substring hint sets compiled to one alternation each, so a single search replaces any(h in s ...)
+def _compile_hints(hints: Iterable[str]) -> re.Pattern[str]:
+    return re.compile("|".join(map(re.escape, sorted(hints))))
+
+DISCO_BLOCKLIST_RE = _compile_hints(DISCO_BLOCKLIST_HINTS)
+NU_METAL_BAD_RE = _compile_hints(NU_METAL_BAD_HINTS)
+CANONICAL_METAL_RE = _compile_hints(CANONICAL_METAL_ARTIST_HINTS)
+
+# Substrings the predicates look for inside genre names; resolved per distinct genre set
+GENRE_HINT_WORDS: Tuple[str, ...] = ("hip hop", "rap", "west coast", "metal", "disco")
 
 # ============================================================
 # Utilities
 # ============================================================
 
+# Genre tags repeat across thousands of tracks; caching also hands back one shared
+# string object per tag, so every track's genre set reuses the same (pre-hashed) keys
+@lru_cache(maxsize=1 << 16)
+def _norm_str(s: str) -> str:
+    return s.strip().lower()
+
 def norm_name(s: Any) -> str:
     return str(s or "").strip().lower()
 
@@ -117,6 +142,12 @@ def safe_int(v: Any) -> Optional[int]:
     except Exception:
         return None
 
+def _coerce_float(v: Any) -> Optional[float]:
+    # Features are almost always floats already; skip the try/except for those
+    if v.__class__ is float:
+        return v
+    return safe_float(v)
+
 def sround(x: Optional[float], nd: int = 2) -> Optional[float]:
     if x is None:
         return None
@@ -125,26 +156,39 @@ def sround(x: Optional[float], nd: int = 2) -> Optional[float]:
     except Exception:
         return None
 
+def _fast_median(vals: List[float]) -> float:
+    # statistics.median semantics (mean of the middle pair for even n) without its
+    # dispatch overhead; the lists here are a handful of seeds or nodes
+    vals = sorted(vals)
+    n = len(vals)
+    mid = n >> 1
+    if n & 1:
+        return vals[mid]
+    return (vals[mid - 1] + vals[mid]) / 2
+
 def median_int(vals: List[int]) -> Optional[int]:
     if not vals:
         return None
-    vals_sorted = sorted(vals)
-    return int(median(vals_sorted))
+    return int(_fast_median(vals))
+
+TEMPO_RANGE = TEMPO_MAX - TEMPO_MIN
 
 def tempo_to_norm(bpm: Optional[float]) -> Optional[float]:
-    if bpm is None:
+    if bpm is None or TEMPO_RANGE <= 0:
         return None
-    x = max(TEMPO_MIN, min(TEMPO_MAX, float(bpm)))
-    rng = TEMPO_MAX - TEMPO_MIN
-    if rng <= 0:
-        return None
-    return (x - TEMPO_MIN) / rng
+    x = float(bpm)
+    # Inline clamp to [TEMPO_MIN, TEMPO_MAX]; NaN maps to TEMPO_MAX
+    if not x <= TEMPO_MAX:
+        x = TEMPO_MAX
+    elif x < TEMPO_MIN:
+        x = TEMPO_MIN
+    return (x - TEMPO_MIN) / TEMPO_RANGE
 
 def track_genres(t: Track) -> Set[str]:
     if "genres" in t and isinstance(t["genres"], list):
-        return {norm_name(g) for g in t["genres"] if isinstance(g, str)}
+        return {_norm_str(g) for g in t["genres"] if isinstance(g, str)}
     if "artist_genres" in t and isinstance(t["artist_genres"], list):
-        return {norm_name(g) for g in t["artist_genres"] if isinstance(g, str)}
+        return {_norm_str(g) for g in t["artist_genres"] if isinstance(g, str)}
     return set()
 
 def track_artist_name(t: Track) -> str:
@@ -154,6 +198,56 @@ def track_artist_name(t: Track) -> str:
         return str(t["artists"][0])
     return "Unknown"
 
+@lru_cache(maxsize=None)
+def _genre_hints(gs: FrozenSet[str]) -> FrozenSet[str]:
+    # Which GENRE_HINT_WORDS occur inside any of the genre names. Tracks by the same
+    # artist share one genre set, so each distinct set is scanned once. Newline-joined
+    # so multi-word hints never match across two genres.
+    joined = "\n".join(gs)
+    return frozenset(h for h in GENRE_HINT_WORDS if h in joined)
+
+def _prepare_track(t: Track) -> Track:
+    # Shallow copy of t carrying the normalized fields predicates, scoring and dedup
+    # read, so the caller's track dict is never modified
+    p = dict(t)
+    gs = frozenset(track_genres(t))
+    p["_genres_norm"] = gs
+    p["_genre_hints"] = _genre_hints(gs)
+    artist = track_artist_name(t)
+    p["_artist_raw"] = artist
+    p["_artist_norm"] = norm_name(artist)
+    p["_name_norm"] = norm_name(t.get("name"))
+    p["_year"] = safe_int(t.get("release_year"))
+    p["_pop"] = _coerce_float(t.get("popularity"))
+    return p
+
+def _prepared(t: Track) -> Track:
+    # Prepared tracks pass through; raw rows get a prepared copy
+    return t if "_genres_norm" in t else _prepare_track(t)
+
+def _prepare_tracks(results: ResultBucket) -> Tuple[ResultBucket, Dict[str, ArtistIndex]]:
+    # Normalize once per track so predicates, scoring and dedup read cached fields.
+    # Returns a new bucket whose pools hold prepared copies (non-object rows dropped);
+    # `results` itself is left untouched. Also returns
+    # pool name -> normalized artist -> [(position in prepared pool, track)]
+    prepared: ResultBucket = {}
+    artist_index: Dict[str, ArtistIndex] = {}
+    for pool_name, tracks in results.items():
+        if not isinstance(tracks, list):
+            prepared[pool_name] = tracks
+            continue
+        cleaned: List[Track] = []
+        by_artist: ArtistIndex = defaultdict(list)
+        for t in tracks:
+            if not isinstance(t, dict):
+                continue
+            p = _prepare_track(t)
+            by_artist[p["_artist_norm"]].append((len(cleaned), p))
+            cleaned.append(p)
+        prepared[pool_name] = cleaned
+        artist_index[pool_name] = by_artist
+    return prepared, artist_index
+
 def nonempty(vals: Iterable[Any]) -> bool:
     for v in vals:
         if v is not None:
@@ -205,44 +299,45 @@ def validate_manifest_shape(root: ManifestTree) -> List[str]:
 def is_core_punk(t: Track) -> bool:
     if t.get("uri") in CURATION_EXCLUDE_URIS:
         return False
-    gs = track_genres(t)
-    if gs & PUNK_NEG_GENRES:
+    t = _prepared(t)
+    gs = t["_genres_norm"]
+    if not gs.isdisjoint(PUNK_NEG_GENRES):
         return False
-    return bool(gs & PUNK_POS_GENRES)
+    return not gs.isdisjoint(PUNK_POS_GENRES)
 
 def is_shoegaze_candidate(t: Track) -> bool:
     if t.get("uri") in CURATION_EXCLUDE_URIS:
         return False
-    artist = norm_name(track_artist_name(t))
-    gs = track_genres(t)
-    return ("shoegaze" in gs) or (artist in SHOEGAZE_WHITELIST_ARTISTS)
+    t = _prepared(t)
+    return ("shoegaze" in t["_genres_norm"]) or (t["_artist_norm"] in SHOEGAZE_WHITELIST_ARTISTS)
 
 def is_east_coast_hiphop(t: Track) -> bool:
     if t.get("uri") in CURATION_EXCLUDE_URIS:
         return False
-    artist = norm_name(track_artist_name(t))
-    gs = track_genres(t)
-    if artist in EC_HIPHOP_WHITELIST_ARTISTS:
+    t = _prepared(t)
+    if t["_artist_norm"] in EC_HIPHOP_WHITELIST_ARTISTS:
         return True
-    if gs & EC_HIPHOP_POS_GENRES:
+    gs = t["_genres_norm"]
+    if not gs.isdisjoint(EC_HIPHOP_POS_GENRES):
         return True
-    if any("west coast" in g for g in gs):
+    hints = t["_genre_hints"]
+    if "west coast" in hints:
         return False
-    hay = " ".join(gs)
-    return ("hip hop" in hay) or ("rap" in hay)
+    return ("hip hop" in hints) or ("rap" in hints)
 
 def is_disco_track(t: Track) -> bool:
     if t.get("uri") in CURATION_EXCLUDE_URIS:
         return False
-    gs = track_genres(t)
-    name = norm_name(t.get("name"))
-    year = safe_int(t.get("release_year"))
-    if any(h in name for h in DISCO_BLOCKLIST_HINTS):
+    t = _prepared(t)
+    gs = t["_genres_norm"]
+    name = t["_name_norm"]
+    year = t["_year"]
+    if DISCO_BLOCKLIST_RE.search(name):
         return False
-    if gs & DISCO_POS_GENRES:
+    if not gs.isdisjoint(DISCO_POS_GENRES):
         return True
     if year is not None and 1974 <= year <= 1985:
-        return "disco" in " ".join(gs)
+        return "disco" in t["_genre_hints"]
     return False
 
 def genre_specific_filter(genre_key: str, tracks: List[Track]) -> List[Track]:
@@ -262,19 +357,17 @@ def genre_specific_filter(genre_key: str, tracks: List[Track]) -> List[Track]:
     if g == "nu metal":
         out: List[Track] = []
         for t in tracks:
-            name = norm_name(t.get("name"))
-            gs = track_genres(t)
-            if "nu metal" in gs and not any(h in name for h in NU_METAL_BAD_HINTS):
+            p = _prepared(t)
+            if "nu metal" in p["_genres_norm"] and not NU_METAL_BAD_RE.search(p["_name_norm"]):
                 out.append(t)
         return out or tracks
     if g == "metal":
         def metal_score(t: Track) -> int:
-            gs = track_genres(t)
+            t = _prepared(t)
             score = 0
-            if "metal" in " ".join(gs):
+            if "metal" in t["_genre_hints"]:
                 score += 2
-            artist = norm_name(track_artist_name(t))
-            if any(k in artist for k in CANONICAL_METAL_ARTIST_HINTS):
+            if CANONICAL_METAL_RE.search(t["_artist_norm"]):
                 score += 3
             return score
         return sorted(tracks, key=metal_score, reverse=True)
@@ -296,31 +389,38 @@ EMPTY_FEATURES: FeatureDict = {
     "instrumentalness": None,
 }
 
-def compute_features_from_tracks(seed_tracks: List[Track]) -> Tuple[FeatureDict, Optional[int]]:
-    fvals: Dict[str, List[float]] = defaultdict(list)
-    years: List[int] = []
+def _tracks_to_feature_columns(tracks: List[Track]) -> Tuple[List[List[float]], List[float], List[int]]:
+    # One pass over tracks filling a column per FEATURE_FIELDS entry, plus tempo and year;
+    # prepared tracks supply their cached year, raw ones are parsed here
+    cols: List[List[float]] = [[] for _ in FEATURE_FIELDS]
+    col_appends = [(f, c.append) for f, c in zip(FEATURE_FIELDS, cols)]
     tempos: List[float] = []
-
-    for t in seed_tracks:
-        for f in FEATURE_FIELDS:
-            fv = safe_float(t.get(f))
+    years: List[int] = []
+    for t in tracks:
+        get = t.get
+        for f, append in col_appends:
+            fv = _coerce_float(get(f))
             if fv is not None:
-                fvals[f].append(fv)
-        bpm = safe_float(t.get("tempo"))
+                append(fv)
+        bpm = _coerce_float(get("tempo"))
         if bpm is not None:
             tempos.append(bpm)
-        y = safe_int(t.get("release_year"))
+        y = t["_year"] if "_year" in t else safe_int(get("release_year"))
         if y is not None:
             years.append(y)
+    return cols, tempos, years
+
+def compute_features_from_tracks(seed_tracks: List[Track]) -> Tuple[FeatureDict, Optional[int]]:
+    cols, tempos, years = _tracks_to_feature_columns(seed_tracks)
 
     features: FeatureDict = dict(EMPTY_FEATURES)
 
-    for k, vals in fvals.items():
+    for k, vals in zip(FEATURE_FIELDS, cols):
         if vals:
-            features[k] = sround(median(vals), 2)
+            features[k] = sround(_fast_median(vals), 2)
 
     if tempos:
-        med_bpm = median(tempos)
+        med_bpm = _fast_median(tempos)
         features["tempo_bpm"] = sround(med_bpm, 2)
         features["tempo_norm"] = sround(tempo_to_norm(med_bpm), 2)
 
@@ -336,14 +436,16 @@ def aggregate_features_from_children(children_nodes: Dict[str, Any]) -> Tuple[Fe
         for k, v in feat.items():
             if v is not None:
                 agg_lists[k].append(float(v))
-        child_year = safe_int(child.get("median_year"))
+        child_year = child.get("median_year")
         if child_year is not None:
-            years.append(child_year)
+            child_year = safe_int(child_year)
+            if child_year is not None:
+                years.append(child_year)
 
     out_feat: FeatureDict = dict(EMPTY_FEATURES)
     for k, vals in agg_lists.items():
         if vals:
-            out_feat[k] = sround(median(vals), 2)
+            out_feat[k] = sround(_fast_median(vals), 2)
 
     med_year = median_int(years)
     return out_feat, med_year
@@ -352,51 +454,83 @@ def aggregate_features_from_children(children_nodes: Dict[str, Any]) -> Tuple[Fe
 # Seed selection
 # ============================================================
 
-def choose_seeds_for_genre(genre_key: str, pool: List[Track], limit: int = SEEDS_PER_GENRE_DEFAULT) -> List[Track]:
+# Era nudges per genre, picked once per call so score() does not branch on the genre
+def _disco_era(year: int) -> float:
+    if not year:
+        return 0.0
+    return 0.5 if 1975 <= year <= 1982 else -0.4
+
+def _shoegaze_era(year: int) -> float:
+    return 0.35 if year and 1989 <= year <= 1996 else 0.0
+
+def _no_era(year: int) -> float:
+    return 0.0
+
+def choose_seeds_for_genre(genre_key: str,
+                           pool: List[Track],
+                           limit: int = SEEDS_PER_GENRE_DEFAULT,
+                           artist_index: Optional[ArtistIndex] = None) -> List[Track]:
+    # Accepts raw or prepared tracks and returns the pool's own dicts. artist_index is
+    # _prepare_tracks' index for this same prepared pool; it is ignored for raw pools,
+    # and without it the shoegaze backfill scans the pool instead
+
     # Remove excluded URIs early
-    pool = [t for t in pool if t.get("uri") not in CURATION_EXCLUDE_URIS]
+    pool = [t for t in pool if isinstance(t, dict) and t.get("uri") not in CURATION_EXCLUDE_URIS]
+    if all("_genres_norm" in t for t in pool):
+        return _choose_prepared_seeds(genre_key, pool, limit, artist_index)
+    # Raw tracks: select over prepared copies, return the caller's dicts
+    copies = [_prepared(t) for t in pool]
+    originals = {id(c): t for c, t in zip(copies, pool)}
+    return [originals[id(c)] for c in _choose_prepared_seeds(genre_key, copies, limit, None)]
+
+def _choose_prepared_seeds(genre_key: str,
+                           pool: List[Track],
+                           limit: int,
+                           artist_index: Optional[ArtistIndex]) -> List[Track]:
 
     # Apply genre specific filters
     pool = genre_specific_filter(genre_key, pool)
 
+    g = norm_name(genre_key)
+    era_fn = _disco_era if g == "disco" else _shoegaze_era if g == "shoegaze" else _no_era
+
     # Score function nudges era and popularity
     def score(t: Track) -> float:
-        pop = safe_float(t.get("popularity")) or 0.0
-        year = safe_int(t.get("release_year")) or 0
-        pop_term = -abs(pop - 60) / 60.0
-        era_term = 0.0
-        g = norm_name(genre_key)
-        if g == "disco" and year:
-            if 1975 <= year <= 1982:
-                era_term += 0.5
-            else:
-                era_term -= 0.4
-        if g == "shoegaze" and year:
-            if 1989 <= year <= 1996:
-                era_term += 0.35
-        return pop_term + era_term
-
-    ranked = sorted(pool, key=score, reverse=True)
+        pop = t["_pop"] or 0.0
+        return -abs(pop - 60) / 60.0 + era_fn(t["_year"] or 0)
 
     # Dedup by artist and title
     dedup: List[Track] = []
-    seen: Set[str] = set()
-    for t in ranked:
-        key = f"{norm_name(track_artist_name(t))}::{norm_name(t.get('name'))}"
-        if key in seen:
-            continue
-        seen.add(key)
-        dedup.append(t)
-        if len(dedup) == limit:
-            break
+    seen: Set[Tuple[str, str]] = set()
+
+    def take(ranked: Iterable[Track]) -> None:
+        for t in ranked:
+            key = (t["_artist_norm"], t["_name_norm"])
+            if key in seen:
+                continue
+            seen.add(key)
+            dedup.append(t)
+            if len(dedup) == limit:
+                break
+
+    # Only the head of the ranking is consumed, so rank a shortlist (stable, same order
+    # as sorted(reverse=True)) and fall back to the full sort if dedup drains it
+    shortlist = max(32, limit * 4)
+    ranked = heapq.nsmallest(shortlist, pool, key=lambda t: -score(t))
+    take(ranked)
+    if len(dedup) < limit and len(ranked) < len(pool):
+        take(sorted(pool, key=score, reverse=True)[len(ranked):])
 
     # Ensure shoegaze gets canonical if missing
-    g = norm_name(genre_key)
     if g == "shoegaze" and len(dedup) < limit:
-        # Backfill from pool by whitelist artist
-        cand = [t for t in pool if norm_name(track_artist_name(t)) in SHOEGAZE_WHITELIST_ARTISTS]
+        # Backfill from pool by whitelist artist, in pool order
+        if artist_index is not None:
+            hits = sorted(hit for a in SHOEGAZE_WHITELIST_ARTISTS for hit in artist_index.get(a, ()))
+            cand = [t for _, t in hits if t.get("uri") not in CURATION_EXCLUDE_URIS]
+        else:
+            cand = [t for t in pool if t["_artist_norm"] in SHOEGAZE_WHITELIST_ARTISTS]
         for t in cand:
-            key = f"{norm_name(track_artist_name(t))}::{norm_name(t.get('name'))}"
+            key = (t["_artist_norm"], t["_name_norm"])
             if key in seen:
                 continue
             dedup.append(t)
@@ -410,17 +544,21 @@ def choose_seeds_for_genre(genre_key: str, pool: List[Track], limit: int = SEEDS
 # Manifest building
 # ============================================================
 
-def resolve_seed_pool(node: ManifestNode, results: ResultBucket) -> List[Track]:
+def resolve_seed_pool_key(node: ManifestNode, results: ResultBucket) -> Optional[str]:
     seeds_key: Optional[str] = node.get("_seeds") if isinstance(node.get("_seeds"), str) else None
     alias_key: Optional[str] = node.get("_alias") if isinstance(node.get("_alias"), str) else None
-    seed_pool: List[Track] = []
-    if seeds_key:
-        seed_pool = results.get(seeds_key, [])
-    if not seed_pool and alias_key:
-        seed_pool = results.get(alias_key, [])
-    return seed_pool
-
-def build_node(name: str, node: ManifestNode, results: ResultBucket, sample_size_per_genre: int) -> ManifestNode:
+    if seeds_key and results.get(seeds_key):
+        return seeds_key
+    if alias_key and results.get(alias_key):
+        return alias_key
+    return None
+
+def build_node(name: str,
+               node: ManifestNode,
+               results: ResultBucket,
+               sample_size_per_genre: int,
+               artist_index: Optional[Dict[str, ArtistIndex]] = None,
+               seed_cache: Optional[Dict[Tuple[str, str], List[Track]]] = None) -> ManifestNode:
     out: ManifestNode = {}
 
     # Build subgenres first
@@ -429,10 +567,12 @@ def build_node(name: str, node: ManifestNode, results: ResultBucket, sample_size
     if isinstance(sub, dict):
         for child_name, child_node in sub.items():
             if isinstance(child_node, dict):
-                sub_out[child_name] = build_node(child_name, child_node, results, sample_size_per_genre)
+                sub_out[child_name] = build_node(child_name, child_node, results, sample_size_per_genre,
+                                                 artist_index, seed_cache)
 
     # Resolve seed pool for this node
-    pool = resolve_seed_pool(node, results)
+    pool_key = resolve_seed_pool_key(node, results)
+    pool = results[pool_key] if pool_key is not None else []
 
     # Choose seeds
     seeds_payload: List[Dict[str, Any]] = []
@@ -440,15 +580,22 @@ def build_node(name: str, node: ManifestNode, results: ResultBucket, sample_size
     med_year: Optional[int] = None
 
     if pool:
-        chosen = choose_seeds_for_genre(name, pool, limit=SEEDS_PER_GENRE_DEFAULT)
-        for t in chosen:
-            seeds_payload.append({
-                "uri": t.get("uri"),
-                "name": t.get("name"),
-                "artist": track_artist_name(t),
-                "popularity": safe_float(t.get("popularity")),
-                "release_year": safe_int(t.get("release_year")),
-            })
+        # Nodes that share a pool and normalize to the same genre pick the same seeds
+        cache_key = (norm_name(name), cast(str, pool_key))
+        chosen = seed_cache.get(cache_key) if seed_cache is not None else None
+        if chosen is None:
+            pool_index = artist_index.get(pool_key) if artist_index is not None else None
+            chosen = choose_seeds_for_genre(name, pool, limit=SEEDS_PER_GENRE_DEFAULT, artist_index=pool_index)
+            if seed_cache is not None:
+                seed_cache[cache_key] = chosen
+        # Seeds chosen from a raw results bucket are raw tracks, so read through _prepared
+        seeds_payload = [{
+            "uri": p.get("uri"),
+            "name": p.get("name"),
+            "artist": p["_artist_raw"],
+            "popularity": p["_pop"],
+            "release_year": p["_year"],
+        } for p in map(_prepared, chosen)]
         features, med_year = compute_features_from_tracks(chosen)
 
     # If no features yet, aggregate from children
@@ -468,10 +615,14 @@ def build_node(name: str, node: ManifestNode, results: ResultBucket, sample_size
     return out
 
 def traverse_collect(node: ManifestNode) -> Iterable[ManifestNode]:
-    yield node
-    if "subgenres" in node and isinstance(node["subgenres"], dict):
-        for child in node["subgenres"].values():
-            yield from traverse_collect(child)
+    # Pre-order via an explicit stack; children pushed reversed so they pop in order
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        subs = n.get("subgenres")
+        if isinstance(subs, dict):
+            stack.extend(reversed(list(subs.values())))
 
 def postprocess_backfill_seeds(tree_out: Dict[str, Any], results: ResultBucket) -> None:
     # If a node has no seeds but has a pool, try to pick some
@@ -497,41 +648,46 @@ def buildManifestTree(root: ManifestTree,
         for p in man_problems + res_problems:
             print("  " + p, file=sys.stderr)
 
+    prepared, artist_index = _prepare_tracks(results)
+    seed_cache: Dict[Tuple[str, str], List[Track]] = {}
+
     # Build nodes
     tree_out: Dict[str, Any] = {}
     for genre_name, node in root.items():
         if isinstance(node, dict):
-            tree_out[genre_name] = build_node(genre_name, node, results, sample_size_per_genre)
+            tree_out[genre_name] = build_node(genre_name, node, prepared, sample_size_per_genre,
+                                              artist_index, seed_cache)
 
     # Collect global feature medians from node features
-    global_vals: Dict[str, List[float]] = defaultdict(list)
+    # One column per FEATURE_FIELDS entry, filled through pre-bound appends
+    global_cols: List[List[float]] = [[] for _ in FEATURE_FIELDS]
+    global_appends = [(k, c.append) for k, c in zip(FEATURE_FIELDS, global_cols)]
     global_years: List[int] = []
     track_count = 0
 
-    def collect(node: ManifestNode):
-        nonlocal track_count
+    # Single iterative walk; medians and counts do not depend on visit order
+    stack = deque(tree_out.values())
+    while stack:
+        node = stack.pop()
         feat = cast(FeatureDict, node.get("features") or {})
-        for k, v in feat.items():
-            if k in FEATURE_FIELDS and v is not None:
-                global_vals[k].append(float(v))
+        for k, append in global_appends:
+            v = feat.get(k)
+            if v is not None:
+                append(float(v))
         if node.get("median_year") is not None:
             iy = safe_int(node["median_year"])
             if iy is not None:
                 global_years.append(iy)
         if "seeds" in node:
-            for _ in node["seeds"]:
-                track_count += 1
-        if "subgenres" in node and isinstance(node["subgenres"], dict):
-            for child in node["subgenres"].values():
-                collect(child)
-
-    for n in tree_out.values():
-        collect(n)
+            track_count += len(node["seeds"])
+        subs = node.get("subgenres")
+        if isinstance(subs, dict):
+            stack.extend(subs.values())
 
     global_features: FeatureDict = dict(EMPTY_FEATURES)
-    for k, vals in global_vals.items():
+    for k, vals in zip(FEATURE_FIELDS, global_cols):
         if vals:
-            global_features[k] = sround(median(vals), 2)
+            global_features[k] = sround(_fast_median(vals), 2)
 
     if global_features.get("tempo_bpm") is not None:
         tbpm = safe_float(global_features["tempo_bpm"])
@@ -585,7 +741,11 @@ def qa_report(export: Dict[str, Any], max_lines: int = 200) -> str:
     for k in ["danceability","energy","speechiness","acousticness","valence","tempo_bpm","tempo_norm","popularity","instrumentalness"]:
         lines.append(f"  {k}: {gf.get(k)}")
 
-    def walk(name: str, node: ManifestNode, depth: int = 0):
+    # Pre-order walk with an explicit stack; stops formatting once max_lines is reached
+    genres = export.get("genres", {})
+    stack: List[Tuple[str, ManifestNode, int]] = [(name, node, 0) for name, node in reversed(list(genres.items()))]
+    while stack and len(lines) < max_lines:
+        name, node, depth = stack.pop()
         indent = "  " * depth
         feat = cast(FeatureDict, node.get("features") or {})
         nulls = count_null_features(feat)
@@ -595,12 +755,7 @@ def qa_report(export: Dict[str, Any], max_lines: int = 200) -> str:
         if depth < 6:
             subs = node.get("subgenres")
             if isinstance(subs, dict):
-                for child_name, child in subs.items():
-                    walk(child_name, child, depth+1)
-
-    genres = export.get("genres", {})
-    for name, node in genres.items():
-        walk(name, node, 0)
+                stack.extend((child_name, child, depth + 1) for child_name, child in reversed(list(subs.items())))
 
     return "\n".join(lines[:max_lines])
 
@@ -609,10 +764,25 @@ def qa_report(export: Dict[str, Any], max_lines: int = 200) -> str:
 # ============================================================
 
 def _load_json(path: str) -> Any:
+    if orjson is not None:
+        with open(path, "rb") as f:
+            raw = f.read()
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # orjson rejects the NaN/Infinity tokens json.dump writes by default
+            return json.loads(raw)
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 def _save_json(path: str, data: Any) -> None:
+    if orjson is not None:
+        # Indent-2, non-ASCII kept, non-str keys stringified. Matches json.dump(indent=2,
+        # ensure_ascii=False) only for finite, ordinarily sized floats: orjson writes
+        # NaN/Infinity as null and formats very small/large floats differently
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
@@ -1,85 +1,144 @@
 import json
 import re
 import math
-from collections import defaultdict, Counter
+from collections import defaultdict, deque, Counter
 from typing import Any, Dict, Tuple, List, Set
 from datetime import datetime, timezone
+from functools import lru_cache
 import random
 import time
 import os
+import sys
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 random.seed(42)
 
-print("=" * 60, flush=True)
-print("Starting Genre Constellation Manifest Generator", flush=True)
-print("=" * 60, flush=True)
+# Startup banner lines are collected and written in one go just before loading
+_startup_log = [
+    "=" * 60,
+    "Starting Genre Constellation Manifest Generator",
+    "=" * 60,
+]
 
 DATA_FILE = 'server/data/prepped.json'
 if not os.path.exists(DATA_FILE):
-    print(f"❌ ERROR: Input file not found: {DATA_FILE}", flush=True)
+    _startup_log.append(f"❌ ERROR: Input file not found: {DATA_FILE}")
+    print("\n".join(_startup_log), flush=True)
     exit(1)
 
-print(f"✓ Found input file: {DATA_FILE}", flush=True)
+_startup_log.append(f"✓ Found input file: {DATA_FILE}")
 file_size_mb = os.path.getsize(DATA_FILE) / (1024 * 1024)
-print(f"✓ File size: {file_size_mb:.1f} MB", flush=True)
+_startup_log.append(f"✓ File size: {file_size_mb:.1f} MB")
 
-start_time = time.time()
-print(f"\nLoading dataset...", flush=True)
-with open(DATA_FILE, 'r', encoding='utf-8') as f:
-    tracks = json.load(f)
+# --- Remove any tracks with 'feat.', 'ft.', 'featuring', or 'with' in the name ---
+_FEATURE_MARKER_RE = re.compile(r'\b(?:feat\.?|ft\.?|featuring|with)\b', re.IGNORECASE)
+# Removes both parentheses and inline usage
+_FEATURE_STRIP_RE = re.compile(r'\s*\(?(?:feat\.?|ft\.?|featuring|with)\s+[^)]+?\)?', re.IGNORECASE)
+_DASH_RUN_RE = re.compile(r'-+')
+
+class _SlugTable(dict):
+    """str.translate table: space -> '-', keep [a-z0-9-], drop everything
+    else. Entries are filled in lazily as new code points are seen."""
+    _KEEP = frozenset("abcdefghijklmnopqrstuvwxyz0123456789-")
+
+    def __missing__(self, cp):
+        ch = chr(cp)
+        out = "-" if ch == " " else (ch if ch in self._KEEP else None)
+        self[cp] = out
+        return out
+
+_SLUG_TABLE = _SlugTable()
+
+def slugify(s):
+    # full Unicode lower() runs first; the table then keeps only [a-z0-9-] and maps space to '-'
+    return _DASH_RUN_RE.sub('-', s.lower().translate(_SLUG_TABLE)).strip('-')
+
+@lru_cache(maxsize=65536)
+def _strip_features_cached(text: str) -> str:
+    return _FEATURE_STRIP_RE.sub('', text).strip()
 
-    # --- Remove any tracks with 'feat.', 'ft.', 'featuring', or 'with' in the name ---
 def strip_features(text: str) -> str:
     """Remove all 'feat.', 'ft.', 'featuring', and similar markers."""
     if not text:
         return ""
-    # Removes both parentheses and inline usage
-    text = re.sub(r'\s*\(?(?:feat\.?|ft\.?|featuring|with)\s+[^)]+?\)?', '', text, flags=re.IGNORECASE)
-    return text.strip()
+    # Artist names repeat across thousands of tracks; only str is cacheable
+    if isinstance(text, str):
+        return _strip_features_cached(text)
+    return _FEATURE_STRIP_RE.sub('', text).strip()
+
+start_time = time.time()
+_startup_log.append(f"\nLoading dataset...")
+print("\n".join(_startup_log), flush=True)
 
 # --- Clean and filter all tracks BEFORE genre grouping ---
-cleaned_tracks = []
-for t in tracks:
-    name = t.get("name", "") or ""
-    # Strict skip: drop any track that includes a feature indicator
-    if re.search(r'\b(feat\.?|ft\.?|featuring|with)\b', name, flags=re.IGNORECASE):
-        continue
+def clean_tracks(raw_tracks):
+    kept = []
+    for t in raw_tracks:
+        name = t.get("name", "") or ""
+        # Strict skip: drop any track that includes a feature indicator
+        if _FEATURE_MARKER_RE.search(name):
+            continue
 
-    # Clean up artist and name text
-    t["name"] = strip_features(name)
-    artists = t.get("artists") or []
-    t["artists"] = [strip_features(a) for a in artists]
-    cleaned_tracks.append(t)
+        # Clean up artist and name text
+        t["name"] = strip_features(name)
+        artists = t.get("artists") or []
+        t["artists"] = [strip_features(a) for a in artists]
+        kept.append(t)
+    return kept
+
+# Streamed through ijson when available so only kept tracks are ever materialized.
+# ijson and orjson both reject the NaN/Infinity tokens json.dump writes by default,
+# so such files are re-read with json.
+tracks = None
+with open(DATA_FILE, 'rb') as f:
+    if ijson is not None:
+        try:
+            tracks = clean_tracks(ijson.items(f, 'item', use_float=True))
+        except ijson.JSONError:
+            f.seek(0)
+    if tracks is None:
+        raw = f.read()
+        parsed = None
+        if orjson is not None:
+            try:
+                parsed = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                pass
+        if parsed is None:
+            parsed = json.loads(raw)
+        raw = None
+        tracks = clean_tracks(parsed)
+        parsed = None  # release the full parsed list
 
-tracks = cleaned_tracks
-    
 load_time = time.time() - start_time
 print(f"✓ Loaded {len(tracks)} tracks in {load_time:.1f}s\n", flush=True)
 
 # -------- Helpers --------
 def generate_filename(artist, track_name):
-    artist = strip_features(artist)
-    track_name = strip_features(track_name)
-
-    safe_artist = (artist or 'unknown').lower().replace(' ', '-')
-    safe_artist = re.sub(r'[^a-z0-9-]', '', safe_artist)
-    safe_artist = re.sub(r'-+', '-', safe_artist).strip('-')
-    
-    safe_name = (track_name or 'unknown').lower().replace(' ', '-')
-    safe_name = re.sub(r'[^a-z0-9-]', '', safe_name)
-    safe_name = re.sub(r'-+', '-', safe_name).strip('-')
-    
+    # artist and track_name come from tracks already run through strip_features
+    # in the cleaning loop above, so they are slugged as-is
+    safe_artist = slugify(artist or 'unknown')
+    safe_name = slugify(track_name or 'unknown')
     return f"{safe_artist}-{safe_name}.json"
 
-def clamp(x, lo, hi):
-    return lo if x < lo else hi if x > hi else x
-
 MIN_BPM = 70.0
 MAX_BPM = 200.0
 
+_BPM_SPAN = MAX_BPM - MIN_BPM
+
 def tempo_to_norm(bpm: float) -> float:
-    return clamp((bpm - MIN_BPM) / (MAX_BPM - MIN_BPM), 0.0, 1.0)
+    x = (bpm - MIN_BPM) / _BPM_SPAN
+    return 0.0 if x < 0.0 else 1.0 if x > 1.0 else x
 
 def median_sorted(vals):
     n = len(vals)
@@ -93,8 +152,7 @@ def median_sorted(vals):
 def median(vals):
     return median_sorted(sorted(vals))
 
-def linear_quantile(vals, q):
-    xs = sorted(vals)
+def linear_quantile_sorted(xs, q):
     n = len(xs)
     if n == 0:
         return None
@@ -111,11 +169,13 @@ def linear_quantile(vals, q):
 def mean(vals):
     return float(sum(vals) / len(vals)) if vals else float("nan")
 
-def stddev(vals):
+def stddev(vals, m=None):
+    # callers that already have the mean pass it in, saving a pass over vals
     n = len(vals)
     if n <= 1:
         return 0.0
-    m = mean(vals)
+    if m is None:
+        m = mean(vals)
     return math.sqrt(sum((x - m) ** 2 for x in vals) / (n - 1))
 
 def sround(x, nd=2):
@@ -139,14 +199,9 @@ def pop_component(pop, center=60.0, plateau=5.0, width=55.0, weight=0.5):
    # Piecewise linear popularity term with a flat top around center±plateau,
     #then falling linearly to zero at center±width.
     #"""
-    delta = abs(pop - center)
-    if delta <= plateau:
-        score = 1.0
-    elif delta >= width:
-        score = 0.0
-    else:
-        score = 1.0 - (delta - plateau) / (width - plateau)
-    return weight * score
+    # Linear ramp clamped to [0, 1]: <= plateau gives 0 (full score), >= width gives 1 (zero)
+    ramp = (abs(pop - center) - plateau) / (width - plateau)
+    return weight * (1.0 - (0.0 if ramp < 0.0 else 1.0 if ramp > 1.0 else ramp))
 
 # def canon(g: str) -> str:
 #     if not g: return ""
@@ -158,7 +213,7 @@ def pop_component(pop, center=60.0, plateau=5.0, width=55.0, weight=0.5):
 
 
 # -------- Deny URIs --------
-TRACK_DENY_URIS = {
+TRACK_DENY_URIS = frozenset({
     "spotify:track:7CZyCXKG6d5ALeq41sLzbw",
     #there are more after this
     "spotify:track:4BggEwLhGfrbrl7JBhC8EC",
@@ -199,7 +254,7 @@ TRACK_DENY_URIS = {
     "spotify:track:0JHREzo9WzIP4vyybhSKPa",  # Five Finger Death Punch — Blue on Black"
     "spotify:track:6mKs2kkBgvf090H566n1pd", #6ix9ine — BEBE"
     "spotify:track:5j3QqRGflS4o5jbsFSwKW1", #DJShawdow
-}
+})
 
 # -------- PASTE YOUR GENRE_TREE HERE --------
 GENRE_TREE = {
@@ -378,30 +433,34 @@ GENRE_TREE = {
 # ===== after GENRE_TREE =====
 from collections.abc import Mapping
 
+_CANON_TRANS = str.maketrans("-_/", "   ")
+_WS_RUN_RE = re.compile(r"\s+")
+
+@lru_cache(maxsize=65536)
 def canon(g: str) -> str:
     if not g: return ""
-    g = g.lower().strip()
-    g = re.sub(r"[-_/]+", " ", g)
-    g = re.sub(r"\s+", " ", g)
-    return g
+    # hyphen/underscore/slash become spaces, then every whitespace run collapses to one
+    return _WS_RUN_RE.sub(" ", g.lower().strip().translate(_CANON_TRANS))
 
 def dump_tree_seeds(tree):
     found = []
-    def walk(node, path="root"):
-        if isinstance(node, Mapping):
-            val = node.get("_seeds", None)
-            if isinstance(val, str):
-                found.append((path, val))
-            elif isinstance(val, (list, tuple)):
-                for v in val:
-                    if isinstance(v, str):
-                        found.append((path, v))
-            # only go into explicit subgenres; avoids weird values
-            subs = node.get("subgenres")
-            if isinstance(subs, Mapping):
-                for k, v in subs.items():
-                    walk(v, f"{path}/{k}")
-    walk(tree)
+    # pre-order via an explicit stack; children pushed reversed so they pop in order
+    stack = [("root", tree)]
+    while stack:
+        path, node = stack.pop()
+        if not isinstance(node, Mapping):
+            continue
+        val = node.get("_seeds", None)
+        if isinstance(val, str):
+            found.append((path, sys.intern(val)))
+        elif isinstance(val, (list, tuple)):
+            for v in val:
+                if isinstance(v, str):
+                    found.append((path, sys.intern(v)))
+        # only go into explicit subgenres; avoids weird values
+        subs = node.get("subgenres")
+        if isinstance(subs, Mapping):
+            stack.extend((f"{path}/{k}", v) for k, v in reversed(list(subs.items())))
     return found
 
 assert isinstance(GENRE_TREE, Mapping), "GENRE_TREE is not a dict-like mapping"
@@ -1248,99 +1307,165 @@ GENRE_RULES: Dict[str, Dict[str, Any]] = {
     },
 }
 
+# Rule tokens are only ever compared against lowercased track strings, so lower
+# (and intern) them once here instead of on every per-track comparison
+_RULE_TOKEN_KEYS = (
+    "require_artist_genres_any",
+    "deny_artist_genres_any",
+    "whitelist_artists",
+    "boost_artist_contains",
+    "deny_name_contains",
+    "allow_artist_genres_any",
+)
+for _rule in GENRE_RULES.values():
+    for _key in _RULE_TOKEN_KEYS:
+        if _rule.get(_key):
+            _rule[_key] = tuple(sys.intern(tok.lower()) for tok in _rule[_key])
+
 # -------- Matching logic --------
+def _is_word_char(ch: str) -> bool:
+    # the same "word" characters as re's \w on str patterns
+    return ch.isalnum() or ch == "_"
+
+def _word_boundary(s: str, i: int) -> bool:
+    # re's \b: exactly one side of position i is a word character
+    return (i > 0 and _is_word_char(s[i - 1])) != (i < len(s) and _is_word_char(s[i]))
+
+def contains_word(hay: str, needle: str) -> bool:
+    """Equivalent to re.search(rf"\b{re.escape(needle)}\b", hay), using str.find
+    plus boundary checks instead of running the regex engine per tag."""
+    width = len(needle)
+    i = hay.find(needle)
+    while i != -1:
+        if _word_boundary(hay, i) and _word_boundary(hay, i + width):
+            return True
+        i = hay.find(needle, i + 1)
+    return False
+
+@lru_cache(maxsize=None)
+def _exclusion_re(search_genre: str):
+    # all of a genre's EXCLUSIONS as one pattern, so each tag is scanned once
+    exclusions = EXCLUSIONS.get(search_genre)
+    if not exclusions:
+        return None
+    return re.compile("|".join(re.escape(e.lower()) for e in exclusions))
+
 def genre_match(search_genre: str, track_genres: List[str]) -> bool:
-    if search_genre in EXCLUSIONS:
-        for exclusion in EXCLUSIONS[search_genre]:
-            if any(exclusion.lower() in g.lower() for g in track_genres):
-                return False
+    excl = _exclusion_re(search_genre)
+    if excl is not None and any(excl.search(g.lower()) for g in track_genres):
+        return False
     sg = search_genre.lower().strip()
-    pat = re.compile(rf"\b{re.escape(sg)}\b")
     for tg in track_genres:
         t = tg.lower().strip()
         if t == sg:
             return True
-        if pat.search(t):
+        if contains_word(t, sg):
             return True
     return False
 
-def passes_rules(target_genre: str, track: Dict[str, Any]) -> bool:
-    rules = GENRE_RULES.get(target_genre.lower())
+@lru_cache(maxsize=None)
+def _rule_token_re(target: str, key: str):
+    """One alternation over a genre's rule tokens under `key`, so each string is
+    scanned once instead of once per token. None if the rule has no tokens."""
+    tokens = (GENRE_RULES.get(target) or {}).get(key) or []
+    if not tokens:
+        return None
+    return re.compile("|".join(map(re.escape, tokens)))
+
+@lru_cache(maxsize=None)
+def _rule_token_set(target: str, key: str):
+    """The same tokens as _rule_token_re, as a frozenset: a tag equal to a token
+    is also a substring hit, so exact matches can be settled by hashing."""
+    tokens = (GENRE_RULES.get(target) or {}).get(key) or []
+    return frozenset(tokens) if tokens else None
+
+def passes_rules_batch(target_genre: str, tracks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Tracks (in order) that pass target_genre's rules. The rule lookups and
+    thresholds are resolved once per batch rather than once per track."""
+    target = target_genre.lower()
+    rules = GENRE_RULES.get(target)
     if not rules:
-        return True
-
-    a_gen = [g.lower() for g in (track.get("artist_genres") or track.get("genres") or [])]
-    artist = (track.get("artists") or [""])[0].lower()
-    name = (track.get("name") or "").lower()
-
-    # Hard denies
-    deny = rules.get("deny_artist_genres_any") or []
-    if deny:
-        for d in deny:
-            if any(d.lower() in g for g in a_gen):
-                return False
-
-    # Require at least one
-    req = rules.get("require_artist_genres_any") or []
-    if req:
-        found = False
-        for r in req:
-            if any(r.lower() in g for g in a_gen):
-                found = True
-                break
-        if not found:
-            return False
-
-    # Whitelist bypass
-    whitelist = rules.get("whitelist_artists") or []
-    if whitelist:
-        if any(w.lower() in artist for w in whitelist):
-            return True
-
-    # Name denies
-    deny_tokens = rules.get("deny_name_contains") or []
-    if deny_tokens:
-        for t in deny_tokens:
-            if t.lower() in name:
-                return False
-
-    # Year gates
-    y = track.get("release_year")
-    try:
-        y = int(y) if y else None
-    except:
-        y = None
-    
-    if y:
-        min_year = rules.get("min_year")
-        max_year = rules.get("max_year")
-        if min_year and y < min_year:
-            return False
-        if max_year and y > max_year:
-            return False
-
-    # Popularity gates
-    pop = float(track.get("popularity", 0) or 0)
+        return list(tracks)
+
+    deny = _rule_token_re(target, "deny_artist_genres_any")
+    deny_exact = _rule_token_set(target, "deny_artist_genres_any")
+    req = _rule_token_re(target, "require_artist_genres_any")
+    req_exact = _rule_token_set(target, "require_artist_genres_any")
+    whitelist = _rule_token_re(target, "whitelist_artists")
+    deny_name = _rule_token_re(target, "deny_name_contains")
+    min_year = rules.get("min_year")
+    max_year = rules.get("max_year")
     pmin = rules.get("popularity_min")
     pmax = rules.get("popularity_max")
-    if pmin and pop < float(pmin):
-        return False
-    if pmax and pop > float(pmax):
-        return False
+    pmin = float(pmin) if pmin else None
+    pmax = float(pmax) if pmax else None
+
+    passed = []
+    for track in tracks:
+        # a track is checked against every genre bucket it sits in, so lower its
+        # strings on first use and keep them on the track
+        a_gen = track.get("_lc_genres")
+        if a_gen is None:
+            a_gen = track["_lc_genres"] = [g.lower() for g in (track.get("artist_genres") or track.get("genres") or [])]
+            track["_lc_artist"] = (track.get("artists") or [""])[0].lower()
+            track["_lc_name"] = (track.get("name") or "").lower()
+        artist = track["_lc_artist"]
+        name = track["_lc_name"]
+
+        # Hard denies (exact tag hits by hash first, substring scan only if none)
+        if deny is not None and (not deny_exact.isdisjoint(a_gen) or any(deny.search(g) for g in a_gen)):
+            continue
+
+        # Require at least one
+        if req is not None and req_exact.isdisjoint(a_gen) and not any(req.search(g) for g in a_gen):
+            continue
+
+        # Whitelist bypass
+        if whitelist is not None and whitelist.search(artist):
+            passed.append(track)
+            continue
+
+        # Name denies
+        if deny_name is not None and deny_name.search(name):
+            continue
+
+        # Year gates
+        y = track.get("release_year")
+        try:
+            y = int(y) if y else None
+        except:
+            y = None
+
+        if y:
+            if min_year and y < min_year:
+                continue
+            if max_year and y > max_year:
+                continue
+
+        # Popularity gates
+        pop = float(track.get("popularity", 0) or 0)
+        if pmin is not None and pop < pmin:
+            continue
+        if pmax is not None and pop > pmax:
+            continue
 
-    return True
+        passed.append(track)
+    return passed
 
 def gather_playable_genres(tree):
     genres = []
-    def walk(node):
-        if not isinstance(node, dict): return
+    # pre-order via an explicit stack; children pushed reversed so they pop in order
+    stack = deque([tree])
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
         seed = node.get("_seeds")
         if isinstance(seed, str):
             genres.append(canon(seed))   # canonicalize here
         subs = node.get("subgenres")
         if isinstance(subs, dict):
-            for v in subs.values():
-                walk(v)
+            stack.extend(reversed(list(subs.values())))
     # unique preserve order
     seen, ordered = set(), []
     for g in genres:
@@ -1357,28 +1482,33 @@ def build_parent_maps(tree: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, S
     genre_to_parent: Dict[str, str] = {}
     parent_to_desc: Dict[str, Set[str]] = {}
 
-    def walk(node: Dict[str, Any], parent_seed: str = ""):
+    # pre-order over (node, parent_label, is_child); children pushed reversed. A child's
+    # own map entries are written when it is popped, so each child and its whole
+    # subtree are handled before its next sibling
+    stack = deque([(tree, "", False)])
+    while stack:
+        node, parent_seed, is_child = stack.pop()
         seed_raw = node.get("_seeds")
         this_seed = canon(seed_raw) if isinstance(seed_raw, str) and seed_raw.strip() else None
 
+        if is_child and this_seed:
+            genre_to_parent[this_seed] = parent_seed or ""
+            if parent_seed:
+                parent_to_desc[parent_seed].add(this_seed)
+
         subs = node.get("subgenres")
-        if isinstance(subs, dict):
-            parent_label = this_seed or parent_seed
-            if parent_label and parent_label not in parent_to_desc:
-                parent_to_desc[parent_label] = set()
-
-            for child in subs.values():
-                if not isinstance(child, dict):
-                    continue
-                child_raw = child.get("_seeds")
-                child_seed = canon(child_raw) if isinstance(child_raw, str) and child_raw.strip() else None
-                if child_seed:
-                    genre_to_parent[child_seed] = parent_label or ""
-                    if parent_label:
-                        parent_to_desc[parent_label].add(child_seed)
-                walk(child, parent_label)
-
-    walk(tree)
+        if not isinstance(subs, dict):
+            continue
+        parent_label = this_seed or parent_seed
+        if parent_label and parent_label not in parent_to_desc:
+            parent_to_desc[parent_label] = set()
+
+        stack.extend(
+            (child, parent_label, True)
+            for child in reversed(list(subs.values()))
+            if isinstance(child, dict)
+        )
+
     return genre_to_parent, parent_to_desc
 
 PLAYABLE_GENRES = gather_playable_genres(GENRE_TREE)
@@ -1394,28 +1524,44 @@ results: Dict[str, List[Dict[str, Any]]] = {}
 used_track_ids_by_parent: Dict[str, Set[str]] = defaultdict(set)
 used_artists_by_parent: Dict[str, Set[str]] = defaultdict(set)
 
+BAD_TOKENS = ("dance pop", "pop", "electropop", "soundtrack")
+
+@lru_cache(maxsize=None)
+def _proto_rule_terms(target: str) -> Tuple[Tuple[str, ...], ...]:
+    """Whitelist / boost / allow / deny lists for one genre, looked up once per
+    genre instead of once per scored track."""
+    rules = GENRE_RULES.get(target, {})
+    return (
+        tuple(rules.get("whitelist_artists", ())),
+        tuple(rules.get("boost_artist_contains", ())),
+        tuple(rules.get("allow_artist_genres_any", ())),
+        tuple(rules.get("deny_artist_genres_any", ())),
+    )
+
 def proto_score(target_genre: str, t: Dict[str, Any]) -> float:
-    tags = norm_tags(t.get("artist_genres") or t.get("genres"))
+    tags = t["_tags"]
     target = target_genre.lower()
-    artists = [a.lower() for a in (t.get("artists") or [])]
+    artists = t.get("_artists_lc")
+    if artists is None:
+        # only scored tracks need this, so fill it on first use rather than at indexing
+        artists = t["_artists_lc"] = [a.lower() for a in (t.get("artists") or [])]
     exact = 2.5 if any(g == target for g in tags) else 0.0
 
-    rules = GENRE_RULES.get(target, {})
-    whitelist = [w.lower() for w in rules.get("whitelist_artists", [])]
-    boost = [b.lower() for b in rules.get("boost_artist_contains", [])]
+    whitelist, boost, allow, deny = _proto_rule_terms(target)
 
     whitelist_bonus = 1.5 if any(w in a for a in artists for w in whitelist) else 0.0
     boost_bonus = 0.8 if any(b in a for a in artists for b in boost) else 0.0
 
-    pop = float(t.get("popularity", 0))
-    pop_score = pop_component(pop, center=69.0, plateau=5.0, width=55.0, weight=0.5)
+    # Depends only on the track, so score it once and reuse it across genres
+    pop_score = t.get("_pop_score")
+    if pop_score is None:
+        pop_score = t["_pop_score"] = pop_component(t["_pop"], center=69.0, plateau=5.0, width=55.0, weight=0.5)
 
-    bad_tokens = {"dance pop", "pop", "electropop", "soundtrack"}
-    contam = -0.3 if any(any(bt in g for g in tags) for bt in bad_tokens) else 0.0
+    contam = t.get("_contam")
+    if contam is None:
+        contam = t["_contam"] = -0.3 if any(any(bt in g for g in tags) for bt in BAD_TOKENS) else 0.0
 
     # --- new: reward depth of genre tag match ---
-    allow = [a.lower() for a in rules.get("allow_artist_genres_any", [])]
-    deny = [d.lower() for d in rules.get("deny_artist_genres_any", [])]
     match_bonus = min(1.2, 0.4 * sum(g in tags for g in allow))
     deny_penalty = -0.5 if any(d in tags for d in deny) else 0.0
 
@@ -1442,6 +1588,10 @@ for track in tracks:
     track_genres = norm_tags(track.get('artist_genres') or track.get('genres'))
     if not track_genres:
         continue
+    # Per-track fields the selection loop and proto_score read, computed once here
+    # instead of once per (genre, track) pair
+    track["_tags"] = track_genres
+    track["_pop"] = float(track.get("popularity", 0))
     for tg in track_genres:
         tracks_by_genre[tg].append(track)
 
@@ -1467,17 +1617,16 @@ for idx, genre in enumerate(PLAYABLE_GENRES, 1):
     genre_lower = genre.lower()
 
     # gather candidates
-    candidates = []
+    matched = []
     for track in tracks_by_genre.get(genre_lower, []):
         tid = track.get("uri") or track.get("id")
-        track_genres = norm_tags(track.get('artist_genres') or track.get('genres'))
+        track_genres = track["_tags"]
         if not tid:
             continue
         if not genre_match(genre, track_genres):
             continue
-        if not passes_rules(genre, track):
-            continue
-        candidates.append(track)
+        matched.append(track)
+    candidates = passes_rules_batch(genre, matched)
 
     if not candidates:
         results[genre] = []
@@ -1682,11 +1831,13 @@ for t in seed_pool.values():
 means = {}; stddevs = {}; quantiles = {}
 for k, vals in accum.items():
     if vals:
-        means[k] = sround(mean(vals), 2)
-        stddevs[k] = sround(stddev(vals), 2)
-        q10 = linear_quantile(vals, 0.10)
-        q50 = linear_quantile(vals, 0.50)
-        q90 = linear_quantile(vals, 0.90)
+        m = mean(vals)
+        means[k] = sround(m, 2)
+        stddevs[k] = sround(stddev(vals, m), 2)
+        xs = sorted(vals)  # sort once, read all three quantiles from it
+        q10 = linear_quantile_sorted(xs, 0.10)
+        q50 = linear_quantile_sorted(xs, 0.50)
+        q90 = linear_quantile_sorted(xs, 0.90)
         quantiles[k] = {"p10": sround(q10, 2), "p50": sround(q50, 2), "p90": sround(q90, 2)}
     else:
         means[k] = None; stddevs[k] = None
@@ -1715,8 +1866,15 @@ manifest["build"] = {
 }
 
 print(f"Saving manifest to file...", flush=True)
-with open('genre_constellation_manifest.json', 'w', encoding='utf-8') as f:
-    json.dump(manifest, f, indent=2, ensure_ascii=False)
+if orjson is not None:
+    # Indent-2, non-ASCII kept, non-str keys stringified. Matches json.dump(indent=2,
+    # ensure_ascii=False) only for finite, ordinarily sized floats: orjson writes
+    # NaN/Infinity as null and formats very small/large floats differently
+    with open('genre_constellation_manifest.json', 'wb') as f:
+        f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+else:
+    with open('genre_constellation_manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
 
 total_time = time.time() - start_time
 print("\n" + "=" * 60, flush=True)
@@ -0,0 +1,78 @@
+import importlib.util
+import os
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(HERE, os.pardir, "extract_genre_seeds_patched_help.py")
+
+# The script is a standalone file rather than a package module, so load it by path
+_spec = importlib.util.spec_from_file_location("extract_genre_seeds_patched_help", SCRIPT)
+helper = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(helper)
+
+
+def raw_pool():
+    return [{
+        "uri": f"spotify:track:{i}",
+        "name": f"Song {i}",
+        "artist": f"Artist {i}",
+        "artist_genres": ["disco"],
+        "popularity": 50 + i,
+        "release_year": 1976 + i,
+        "energy": 0.5,
+        "tempo": 120.0,
+    } for i in range(6)]
+
+
+class RawTrackTests(unittest.TestCase):
+
+    def test_features_from_seeds_chosen_on_raw_tracks(self):
+        pool = raw_pool()
+        chosen = helper.choose_seeds_for_genre("disco", pool)
+        self.assertTrue(chosen)
+        features, med_year = helper.compute_features_from_tracks(chosen)
+        self.assertEqual(med_year, helper.median_int([t["release_year"] for t in chosen]))
+        self.assertEqual(features["energy"], 0.5)
+
+    def test_build_node_on_raw_results(self):
+        results = {"disco_pool": raw_pool()}
+        node = {"_seeds": "disco_pool"}
+        out = helper.build_node("disco", node, results, helper.SAMPLE_SIZE_PER_GENRE_DEFAULT)
+        seeds = out["seeds"]
+        self.assertTrue(seeds)
+        for s in seeds:
+            self.assertTrue(s["artist"].startswith("Artist "))
+            self.assertIsInstance(s["release_year"], int)
+        self.assertTrue(all("_genres_norm" not in t for t in results["disco_pool"]))
+
+    def test_raw_and_prepared_pools_choose_the_same_seeds(self):
+        pool = raw_pool() + [
+            {"uri": "spotify:track:sg1", "name": "Soon", "artist": "My Bloody Valentine",
+             "artist_genres": ["noise pop"], "popularity": 55, "release_year": 1990},
+            {"uri": "spotify:track:sg2", "name": "Alison", "artist": "Slowdive",
+             "artist_genres": ["shoegaze"], "popularity": 60, "release_year": 1993},
+            {"uri": sorted(helper.CURATION_EXCLUDE_URIS)[0], "name": "Excluded", "artist": "Slowdive",
+             "artist_genres": ["shoegaze", "disco"], "popularity": 60, "release_year": 1979},
+        ]
+        prepared, index = helper._prepare_tracks({"pool": pool})
+        for genre in ("disco", "shoegaze", "punk", "metal", "nu metal", "east coast hip hop", "pop"):
+            raw_chosen = helper.choose_seeds_for_genre(genre, pool)
+            prep_chosen = helper.choose_seeds_for_genre(genre, prepared["pool"],
+                                                        artist_index=index["pool"])
+            self.assertEqual([t["uri"] for t in raw_chosen], [t["uri"] for t in prep_chosen], genre)
+            self.assertTrue(all(any(t is r for r in pool) for t in raw_chosen), genre)
+            self.assertNotIn("Excluded", [t["name"] for t in raw_chosen], genre)
+
+    def test_predicates_and_filters_accept_raw_tracks(self):
+        pool = raw_pool()
+        self.assertTrue(all(helper.is_disco_track(t) for t in pool))
+        self.assertFalse(any(helper.is_core_punk(t) for t in pool))
+        self.assertFalse(any(helper.is_shoegaze_candidate(t) for t in pool))
+        self.assertFalse(any(helper.is_east_coast_hiphop(t) for t in pool))
+        for genre in ("disco", "shoegaze", "punk", "metal", "nu metal", "east coast hip hop"):
+            self.assertEqual(len(helper.genre_specific_filter(genre, pool)), len(pool), genre)
+        self.assertEqual(pool, raw_pool())
+
+
+if __name__ == "__main__":
+    unittest.main()